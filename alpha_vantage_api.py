@@ -0,0 +1,47 @@
+from datetime import timedelta
+import config
+from rate_limiter import alpha_vantage_limiter
+from cache import cached
+from http_client import session
+
+# orjson decodes large Alpha Vantage payloads much faster; fall back to stdlib json
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
+
+AV_URL = "https://www.alphavantage.co/query"
+
+def av_get(function, symbol, **params):
+    """
+    Calls an Alpha Vantage endpoint over the shared keep-alive session
+    and returns the decoded JSON.
+    """
+    response = session.get(AV_URL, params={
+        'function': function,
+        'symbol': symbol,
+        'apikey': config.ALPHA_VANTAGE_API_KEY,
+        **params
+    }, timeout=30)
+    response.raise_for_status()
+    return json_loads(response.content)
+
+# Raw payloads needed by both the screener and research, defined once
+# so both share one cache entry and one TTL per endpoint
+
+@cached(endpoint='overview', ttl=timedelta(days=30), memoize=True)
+def fetch_overview(ticker):
+    """Fetches the raw Alpha Vantage company overview."""
+    # Rate limit: Wait if needed
+    alpha_vantage_limiter.wait_if_needed()
+    data = av_get('OVERVIEW', ticker)
+    # Unknown symbols and API limit notes come back without a Symbol field
+    return data if 'Symbol' in data else {}
+
+@cached(endpoint='cash_flow', ttl=timedelta(days=90), memoize=True)
+def fetch_cash_flow(ticker):
+    """Fetches the raw Alpha Vantage annual cash flow statement."""
+    # Rate limit: Wait if needed
+    alpha_vantage_limiter.wait_if_needed()
+    data = av_get('CASH_FLOW', ticker)
+    return data if 'annualReports' in data else {}
@@ -0,0 +1,123 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from functools import wraps
+
+import config
+
+class FileCache:
+    """
+    On-disk JSON cache with a time-to-live per entry.
+    Entries are stored as {cache_dir}/{endpoint}/{key}.json holding
+    fetched_at, ttl and payload. Expired entries are evicted on read.
+    """
+    def __init__(self, cache_dir=config.CACHE_DIR):
+        self.cache_dir = cache_dir
+
+    def _path(self, endpoint, key):
+        return os.path.join(self.cache_dir, endpoint, f"{key}.json")
+
+    def get(self, endpoint, key):
+        """Return the cached payload, or None if missing or expired."""
+        entry = self.get_entry(endpoint, key)
+        return entry.get('payload') if entry else None
+
+    def get_entry(self, endpoint, key):
+        """Return the whole unexpired entry (fetched_at, ttl, payload), or None."""
+        path = self._path(endpoint, key)
+        try:
+            with open(path, 'r') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if time.time() - entry.get('fetched_at', 0) > entry.get('ttl', 0):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+
+        return entry
+
+    def set(self, endpoint, key, payload, ttl_seconds):
+        """
+        Store a payload for ttl_seconds.
+        Written to a temp file and renamed so readers never see a partial entry.
+        """
+        directory = os.path.join(self.cache_dir, endpoint)
+        os.makedirs(directory, exist_ok=True)
+
+        entry = {'fetched_at': time.time(), 'ttl': ttl_seconds, 'payload': payload}
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(entry, f)
+            os.replace(tmp_path, self._path(endpoint, key))
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def clear(self, endpoint=None):
+        """Remove all entries, or only those of one endpoint."""
+        path = self.cache_dir if endpoint is None else os.path.join(self.cache_dir, endpoint)
+        shutil.rmtree(path, ignore_errors=True)
+
+# Global file cache shared by all fetchers
+file_cache = FileCache()
+
+def make_key(endpoint, args, kwargs):
+    """Builds a stable cache key from the endpoint and call arguments."""
+    raw = f"{endpoint}:{args!r}:{sorted(kwargs.items())!r}"
+    return hashlib.md5(raw.encode('utf-8')).hexdigest()
+
+def cached(endpoint, ttl, memoize=False):
+    """
+    Decorator caching a fetch function's result on disk.
+
+    Args:
+        endpoint: Cache namespace (sub-directory), e.g. 'overview'
+        ttl: timedelta after which an entry is refetched
+        memoize: Also keep results in process memory until their entry expires,
+            so repeat lookups skip the file read (exposed as wrapper.cache_clear)
+
+    Empty results (None, {}, []) are treated as failed fetches and never cached,
+    on disk or in memory, so a throttled or failed call is retried next time.
+    Pass force_refresh=True to the wrapped function to bypass a cached entry.
+    """
+    ttl_seconds = ttl.total_seconds()
+
+    def decorator(func):
+        # key -> (expires_at, payload); only ever holds non-empty payloads
+        memo = {}
+
+        @wraps(func)
+        def wrapper(*args, force_refresh=False, **kwargs):
+            key = make_key(endpoint, args, kwargs)
+            if not force_refresh:
+                hit = memo.get(key)
+                if hit is not None and hit[0] > time.time():
+                    return hit[1]
+
+                entry = file_cache.get_entry(endpoint, key)
+                if entry is not None and entry.get('payload') is not None:
+                    if memoize:
+                        memo[key] = (entry['fetched_at'] + entry['ttl'], entry['payload'])
+                    return entry['payload']
+
+            payload = func(*args, **kwargs)
+            if payload:
+                if memoize:
+                    memo[key] = (time.time() + ttl_seconds, payload)
+                try:
+                    file_cache.set(endpoint, key, payload, ttl_seconds)
+                except OSError as e:
+                    print(f"Could not write {endpoint} cache entry: {e}")
+            return payload
+
+        wrapper.cache_clear = memo.clear
+        return wrapper
+    return decorator
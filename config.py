@@ -16,3 +16,6 @@ MIN_DROP_FROM_HIGH_PCT = 0.25  # 25% or more below 52-week high
 # Analysis Configuration
 MIN_INSIDER_BUY_VALUE = 100_000  # $100k
 INSIDER_LOOKBACK_DAYS = 180  # 6 months
+
+# Cache Configuration
+CACHE_DIR = ".cache"  # On-disk cache for API responses
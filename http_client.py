@@ -0,0 +1,24 @@
+import requests
+import socket
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection
+from urllib3.util import make_headers
+from urllib3.util.retry import Retry
+
+class _TunedHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter with TCP_NODELAY and a 1 MB receive buffer for large statement payloads."""
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs['socket_options'] = HTTPConnection.default_socket_options + [
+            (socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+        ]
+        super().init_poolmanager(*args, **kwargs)
+
+# Shared HTTP session (Alpha Vantage, Google News, Wikipedia) so connections are kept alive and reused
+session = requests.Session()
+# Advertise every compression scheme urllib3 can decode here (gzip, deflate, plus br if brotli is installed)
+session.headers.update(make_headers(accept_encoding=True))
+session.mount("https://", _TunedHTTPAdapter(
+    pool_connections=10,
+    pool_maxsize=20,
+    max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504])
+))
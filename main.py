@@ -1,3 +1,4 @@
+import logging
 import screener
 import analysis
 import research
@@ -12,6 +13,11 @@ import os
 from recommendation_history import RecommendationHistory
 
 def main():
+    # Screener progress is reported through logging; keep other libraries
+    # (e.g. the OpenAI client's per-request httpx lines) at WARNING
+    logging.basicConfig(level=logging.WARNING, format='%(message)s')
+    logging.getLogger('screener').setLevel(logging.INFO)
+    
     print("=== Stock Recommendation Application (Updated) ===")
     
     # Initialize recommendation history
@@ -66,11 +72,11 @@ def main():
         try:
             # Data Fetching
             analysis_data = analysis.analyze_stock(ticker)
-            context = research.get_context_for_ai(ticker)
-            quarterly_financials = research.get_quarterly_financials(ticker)
-            quarterly_financials = research.get_quarterly_financials(ticker)
-            earnings_history = research.get_earnings_history(ticker)
-            company_info = research.get_company_info(ticker)
+            research_bundle = research.get_research_bundle(ticker)
+            context = research_bundle['context']
+            quarterly_financials = research_bundle['quarterly_financials']
+            earnings_history = research_bundle['earnings_history']
+            company_info = research_bundle['info']
             
             # AI Analysis
             mgmt_analysis = ai.analyze_management(ticker, context)
@@ -1,11 +1,13 @@
 import time
+import threading
 from collections import deque
 from datetime import datetime, timedelta
 
 class RateLimiter:
     """
     Rate limiter to ensure API calls don't exceed specified limits.
-    Uses a sliding window approach to track calls.
+    Uses a sliding window approach to track calls (including reserved future slots).
+    Safe to share between threads.
     """
     def __init__(self, max_calls, time_window_seconds):
         """
@@ -18,49 +20,51 @@ class RateLimiter:
         self.max_calls = max_calls
         self.time_window = timedelta(seconds=time_window_seconds)
         self.calls = deque()
+        self._lock = threading.Lock()
     
     def wait_if_needed(self):
         """
         Wait if necessary to stay within rate limits.
         Automatically removes old calls outside the time window.
-        """
-        now = datetime.now()
-        
-        # Remove calls outside the time window
-        while self.calls and (now - self.calls[0]) > self.time_window:
-            self.calls.popleft()
         
-        # If at limit, wait until oldest call expires
-        if len(self.calls) >= self.max_calls:
-            oldest_call = self.calls[0]
-            wait_until = oldest_call + self.time_window
-            wait_seconds = (wait_until - now).total_seconds()
+        A call slot is reserved under the lock and the wait happens outside it,
+        so concurrent callers back off in parallel instead of queuing on the lock.
+        """
+        with self._lock:
+            now = datetime.now()
+            
+            # Remove calls outside the time window
+            while self.calls and (now - self.calls[0]) > self.time_window:
+                self.calls.popleft()
+            
+            # If at limit, this call may start once the call max_calls back expires
+            scheduled = now
+            if len(self.calls) >= self.max_calls:
+                scheduled = max(now, self.calls[-self.max_calls] + self.time_window)
             
-            if wait_seconds > 0:
-                print(f"Rate limit reached. Waiting {wait_seconds:.1f} seconds...")
-                time.sleep(wait_seconds + 0.1)  # Add small buffer
-                
-                # Clean up again after waiting
-                now = datetime.now()
-                while self.calls and (now - self.calls[0]) > self.time_window:
-                    self.calls.popleft()
+            # Reserve this call's slot
+            self.calls.append(scheduled)
         
-        # Record this call
-        self.calls.append(now)
+        wait_seconds = (scheduled - now).total_seconds()
+        if wait_seconds > 0:
+            print(f"Rate limit reached. Waiting {wait_seconds:.1f} seconds...")
+            time.sleep(wait_seconds + 0.1)  # Add small buffer
     
     def get_current_usage(self):
         """Get current number of calls in the time window."""
-        now = datetime.now()
-        
-        # Remove old calls
-        while self.calls and (now - self.calls[0]) > self.time_window:
-            self.calls.popleft()
-        
-        return len(self.calls)
+        with self._lock:
+            now = datetime.now()
+            
+            # Remove old calls
+            while self.calls and (now - self.calls[0]) > self.time_window:
+                self.calls.popleft()
+            
+            return len(self.calls)
     
     def reset(self):
         """Reset the rate limiter."""
-        self.calls.clear()
+        with self._lock:
+            self.calls.clear()
 
 # Global rate limiter for Alpha Vantage (75 calls per minute)
 alpha_vantage_limiter = RateLimiter(max_calls=75, time_window_seconds=60)
@@ -5,11 +5,12 @@ from reportlab.lib import colors
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image, Table, TableStyle, PageBreak
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
+from reportlab.graphics.shapes import Drawing, Rect, String, Line
 from io import BytesIO
+import threading
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
-import ai_analysis
 
 # Professional Color Scheme
 NAVY_BLUE = colors.HexColor('#1a3a52')
@@ -21,6 +22,19 @@ SUCCESS_GREEN = colors.HexColor('#28a745')
 WARNING_YELLOW = colors.HexColor('#ffc107')
 from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
 
+# Per-thread scratch buffer reused for PNG rendering across charts/reports
+_tls = threading.local()
+
+def _render_png(**savefig_kwargs):
+    """Renders the current matplotlib figure to PNG and returns a fresh BytesIO."""
+    buf = getattr(_tls, 'buf', None)
+    if buf is None:
+        buf = _tls.buf = BytesIO()
+    buf.seek(0)
+    buf.truncate()
+    plt.savefig(buf, format='png', **savefig_kwargs)
+    return BytesIO(buf.getvalue())
+
 class NumberedCanvas(canvas.Canvas):
     """Custom canvas for headers and footers"""
     def __init__(self, *args, **kwargs):
@@ -185,20 +199,26 @@ def create_cover_page(story, report_data, styles):
 def generate_charts(ticker, price_history, insider_data, ai_prediction=None):
     """
     Generates professional charts for the report.
-    Returns a dictionary of BytesIO objects containing the chart images.
+    Returns a dictionary of BytesIO objects containing the chart images,
+    except the insider chart which is a native ReportLab Drawing.
     """
     charts = {}
     
     # Set professional style
     plt.style.use('seaborn-v0_8-darkgrid')
     
-    # 1. 5-Year Price History Chart
+    # Weekly closes are visually identical at report size and far cheaper to draw
+    weekly_close = None
     if price_history is not None and not price_history.empty:
+        weekly_close = price_history['Close'].resample('W').last().dropna()
+    
+    # 1. 5-Year Price History Chart
+    if weekly_close is not None:
         fig, ax = plt.subplots(figsize=(10, 5))
-        ax.plot(price_history.index, price_history['Close'], 
+        ax.plot(weekly_close.index, weekly_close.values, 
                 label='Close Price', color='#2E86AB', linewidth=2)
-        ax.fill_between(price_history.index, price_history['Close'], 
-                        alpha=0.3, color='#2E86AB')
+        ax.fill_between(weekly_close.index, weekly_close.values, 0,
+                        step=None, interpolate=False, alpha=0.3, color='#2E86AB')
         ax.set_title(f"{ticker} 5-Year Price History", fontsize=16, fontweight='bold')
         ax.set_xlabel("Date", fontsize=12)
         ax.set_ylabel("Price ($)", fontsize=12)
@@ -206,38 +226,37 @@ def generate_charts(ticker, price_history, insider_data, ai_prediction=None):
         ax.legend(fontsize=10)
         plt.tight_layout()
         
-        buf = BytesIO()
-        plt.savefig(buf, format='png', dpi=150, bbox_inches='tight')
-        buf.seek(0)
-        charts['price_chart'] = buf
+        charts['price_chart'] = _render_png(dpi=150, bbox_inches='tight')
         plt.close()
     
     # 2. 5-Year Price Prediction Chart
-    if ai_prediction and price_history is not None and not price_history.empty:
+    if ai_prediction and weekly_close is not None:
         fig, ax = plt.subplots(figsize=(10, 5))
         
         # Historical data
-        ax.plot(price_history.index, price_history['Close'], 
+        ax.plot(weekly_close.index, weekly_close.values, 
                 label='Historical Price', color='#2E86AB', linewidth=2)
         
         # Prediction data
         last_date = price_history.index[0]  # Stooq returns newest first
         last_price = price_history['Close'].iloc[0]
         
-        # Generate prediction dates (5 years forward)
-        pred_dates = pd.date_range(start=last_date, periods=60, freq='ME')
+        # Generate prediction dates (5 years forward, one per month)
+        pred_dates = (np.datetime64(last_date.to_datetime64(), 'M')
+                      + np.arange(1, 61).astype('timedelta64[M]')).astype('datetime64[D]')
         
         # Use AI prediction or generate simple trend
         if 'predicted_prices' in ai_prediction:
-            pred_prices = ai_prediction['predicted_prices']
+            pred_prices = np.asarray(ai_prediction['predicted_prices'], dtype=np.float64)
         else:
             # Simple linear projection based on AI growth rate
             growth_rate = ai_prediction.get('annual_growth_rate', 0.10)
-            pred_prices = [last_price * ((1 + growth_rate) ** (i/12)) for i in range(60)]
+            pred_prices = last_price * (1 + growth_rate) ** (np.arange(60) / 12)
         
         ax.plot(pred_dates, pred_prices, 
                 label='AI Prediction', color='#06A77D', linewidth=2, linestyle='--')
-        ax.fill_between(pred_dates, pred_prices, alpha=0.2, color='#06A77D')
+        ax.fill_between(pred_dates, pred_prices, 0,
+                        step=None, interpolate=False, alpha=0.2, color='#06A77D')
         
         ax.axvline(x=last_date, color='red', linestyle=':', linewidth=1, alpha=0.7)
         ax.text(last_date, ax.get_ylim()[1]*0.95, 'Today', 
@@ -251,36 +270,32 @@ def generate_charts(ticker, price_history, insider_data, ai_prediction=None):
         ax.legend(fontsize=10)
         plt.tight_layout()
         
-        buf = BytesIO()
-        plt.savefig(buf, format='png', dpi=150, bbox_inches='tight')
-        buf.seek(0)
-        charts['prediction_chart'] = buf
+        charts['prediction_chart'] = _render_png(dpi=150, bbox_inches='tight')
         plt.close()
     
-    # 3. Insider Activity Chart
+    # 3. Insider Activity Chart (drawn natively, no matplotlib/PNG round-trip)
     if insider_data:
-        fig, ax = plt.subplots(figsize=(7, 4))
-        labels = ['Buys', 'Sells']
-        values = [insider_data['buys'], insider_data['sells']]
-        colors_list = ['#06A77D', '#D62828']
-        
-        bars = ax.bar(labels, values, color=colors_list, edgecolor='black', linewidth=1.5)
-        ax.set_title(f"{ticker} Insider Activity", fontsize=14, fontweight='bold')
-        ax.set_ylabel("Number of Transactions", fontsize=11)
-        ax.grid(axis='y', alpha=0.3, linestyle='--')
-        
-        # Add value labels on bars
-        for bar in bars:
-            height = bar.get_height()
-            ax.text(bar.get_x() + bar.get_width()/2., height,
-                   f'{int(height)}', ha='center', va='bottom', fontsize=10, fontweight='bold')
-        
-        plt.tight_layout()
-        buf = BytesIO()
-        plt.savefig(buf, format='png', dpi=150, bbox_inches='tight')
-        buf.seek(0)
-        charts['insider_chart'] = buf
-        plt.close()
+        buys = insider_data['buys']
+        sells = insider_data['sells']
+        max_value = max(buys, sells, 1)
+        bar_area_height = 160
+        
+        drawing = Drawing(400, 250)
+        drawing.add(String(200, 225, f"{ticker} Insider Activity",
+                           fontName='Helvetica-Bold', fontSize=14, textAnchor='middle'))
+        drawing.add(Line(60, 40, 340, 40, strokeColor=colors.black))
+        
+        for x, label, value, color in ((110, 'Buys', buys, '#06A77D'), (230, 'Sells', sells, '#D62828')):
+            height = bar_area_height * value / max_value
+            drawing.add(Rect(x, 40, 60, height, fillColor=colors.HexColor(color),
+                             strokeColor=colors.black, strokeWidth=1.5))
+            # Value label on top of the bar, category label underneath
+            drawing.add(String(x + 30, 45 + height, f'{int(value)}',
+                               fontName='Helvetica-Bold', fontSize=10, textAnchor='middle'))
+            drawing.add(String(x + 30, 25, label,
+                               fontName='Helvetica', fontSize=11, textAnchor='middle'))
+        
+        charts['insider_chart'] = drawing
         
     return charts
 
@@ -304,26 +319,23 @@ def generate_pe_chart(price_data, earnings_data):
         eps['reportedEPS'] = pd.to_numeric(eps['reportedEPS'], errors='coerce')
         eps = eps.set_index('fiscalDateEnding').sort_index()
         
-        # Calculate TTM EPS for each price date
-        pe_ratios = []
-        dates = []
-        
-        for date, row in prices.iterrows():
-            # Get last 4 quarters of EPS before this date
-            past_earnings = eps[eps.index <= date].tail(4)
-            if len(past_earnings) < 4:
-                continue
-                
-            ttm_eps = past_earnings['reportedEPS'].sum()
-            
-            if ttm_eps > 0:
-                pe = row['Close'] / ttm_eps
-                # Filter outliers
-                if 0 < pe < 100: 
-                    pe_ratios.append(pe)
-                    dates.append(date)
-        
-        if not pe_ratios:
+        # TTM EPS = sum of the last 4 reported quarters (NaN at fewer than 4)
+        ttm_eps = eps['reportedEPS'].fillna(0).rolling(4).sum().to_numpy()
+        
+        # Align each price date with the latest quarter ending on or before it
+        quarter_idx = eps.index.searchsorted(prices.index, side='right') - 1
+        ttm_aligned = np.where(quarter_idx >= 0, ttm_eps[np.maximum(quarter_idx, 0)], np.nan)
+        
+        closes = prices['Close'].to_numpy(dtype=np.float64)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            pe_all = closes / ttm_aligned
+        
+        # Positive earnings only, and filter outliers
+        valid = (ttm_aligned > 0) & (pe_all > 0) & (pe_all < 100)
+        pe_ratios = pe_all[valid]
+        dates = prices.index.values[valid]
+        
+        if not pe_ratios.size:
             return None
             
         plt.figure(figsize=(10, 4))
@@ -333,10 +345,8 @@ def generate_pe_chart(price_data, earnings_data):
         plt.grid(True, alpha=0.3)
         plt.tight_layout()
         
-        buf = BytesIO()
-        plt.savefig(buf, format='png', dpi=100)
+        buf = _render_png(dpi=100)
         plt.close()
-        buf.seek(0)
         return buf
     except Exception as e:
         print(f"Error generating P/E chart: {e}")
@@ -357,8 +367,10 @@ def create_pdf_report(filename, report_data, charts):
     Generates a professional PDF report with enhanced design.
     """
     # Custom document template with headers/footers
+    # Build into memory and write the finished PDF to disk in one go
+    pdf_buffer = BytesIO()
     doc = SimpleDocTemplate(
-        filename, 
+        pdf_buffer, 
         pagesize=letter,
         topMargin=0.75*inch, 
         bottomMargin=0.75*inch,
@@ -613,6 +625,11 @@ def create_pdf_report(filename, report_data, charts):
     story.append(t2)
     story.append(Spacer(1, 20))
     
+    # Insider Activity Chart
+    if 'insider_chart' in charts:
+        story.append(charts['insider_chart'])
+        story.append(Spacer(1, 20))
+    
     # 4. Income Statement Analysis
     story.append(Paragraph("4. Income Statement Analysis", heading_style))
     
@@ -620,7 +637,7 @@ def create_pdf_report(filename, report_data, charts):
     if q_financials:
         q_data = [["Quarter Ending", "Revenue ($M)", "Net Income ($M)", "EPS ($)"]]
         for q in q_financials:
-            eps_value = q.get('reportedEPS')
+            eps_value = q.reportedEPS
             # Display actual EPS value (including zero and negatives), only show N/A if truly missing
             if eps_value is not None:
                 eps_display = f"{eps_value:.2f}"
@@ -628,9 +645,9 @@ def create_pdf_report(filename, report_data, charts):
                 eps_display = "N/A"
             
             q_data.append([
-                q['fiscalDateEnding'],
-                format_billions(q['totalRevenue']).replace('$', ''), # Remove $ since header has ($B)
-                format_billions(q['netIncome']).replace('$', ''),
+                q.fiscalDateEnding,
+                format_billions(q.totalRevenue).replace('$', ''), # Remove $ since header has ($B)
+                format_billions(q.netIncome).replace('$', ''),
                 eps_display
             ])
             
@@ -974,6 +991,8 @@ def create_pdf_report(filename, report_data, charts):
         return NumberedCanvas(*args, **kwargs)
     
     doc.build(story, canvasmaker=create_canvas)
+    with open(filename, 'wb') as f:
+        f.write(pdf_buffer.getbuffer())
     print(f"Professional PDF Report generated: {filename}")
 
 def generate_report(stock_data, news_items, filename="investment_thesis.md"):
@@ -1,120 +1,175 @@
-import requests
 import xml.etree.ElementTree as ET
-import ssl
 import time
-from alpha_vantage.fundamentaldata import FundamentalData
-from alpha_vantage.timeseries import TimeSeries
-import config
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from datetime import timedelta
+from email.utils import parsedate_to_datetime
 from rate_limiter import alpha_vantage_limiter
+from cache import cached, file_cache
+from http_client import session
+from alpha_vantage_api import av_get, fetch_overview, fetch_cash_flow
 
-def safe_float(val):
-    """Safely converts a value to float, handling None and '-'."""
-    if val is None:
+__all__ = [
+    'get_news',
+    'get_company_info',
+    'get_balance_sheet',
+    'get_cash_flow',
+    'FinancialPeriod',
+    'get_quarterly_financials',
+    'get_annual_financials',
+    'get_earnings_history',
+    'get_context_for_ai',
+    'get_contexts_for_ai',
+    'get_research_bundle',
+    'clear_research_cache'
+]
+
+# Values Alpha Vantage uses for missing data
+_NULL_TOKENS = frozenset({"", "-", "None", "none"})
+
+def _av_float(val):
+    """Converts an Alpha Vantage value to float, returning None for missing data."""
+    if val is None or (isinstance(val, str) and val.strip() in _NULL_TOKENS):
         return None
-    if isinstance(val, str):
-        if val.strip() == '-' or val.strip().lower() == 'none':
-            return None
     try:
         return float(val)
     except (ValueError, TypeError):
         return None
 
-# Bypass SSL verification for legacy systems/macOS specific issues
-ssl._create_default_https_context = ssl._create_unverified_context
+# Statement fields parsed by get_balance_sheet / get_cash_flow
+_BALANCE_SHEET_FIELDS = (
+    "totalAssets", "totalLiabilities", "totalShareholderEquity",
+    "cashAndCashEquivalentsAtCarryingValue", "shortTermDebt", "longTermDebt",
+    "totalCurrentAssets", "totalCurrentLiabilities"
+)
+_CASH_FLOW_FIELDS = (
+    "operatingCashflow", "cashflowFromInvestment", "cashflowFromFinancing", "capitalExpenditures"
+)
+
+# RSS item fields returned by get_news
+_NEWS_FIELDS = ('title', 'link', 'pubDate')
 
+def _parse_pub_date(pub_date):
+    """Converts an RFC 822 RSS pubDate to an ISO 8601 string, or None if unparseable."""
+    try:
+        return parsedate_to_datetime(pub_date).isoformat()
+    except (TypeError, ValueError):
+        return None
+
+@cached(endpoint='news', ttl=timedelta(hours=1))
 def get_news(ticker):
     """
     Fetches news from Google News RSS.
-    Returns a list of dictionaries with title, link, and pubDate.
+    Returns a list of dictionaries with title, link, pubDate and published
+    (pubDate as an ISO 8601 string, None if it could not be parsed).
     """
     url = f"https://news.google.com/rss/search?q={ticker}+stock"
     try:
-        response = requests.get(url, timeout=10)
-        response.raise_for_status()
-        
-        root = ET.fromstring(response.content)
         news_items = []
         
-        for item in root.findall('./channel/item')[:5]: # Top 5 news
-            title = item.find('title').text
-            link = item.find('link').text
-            pub_date = item.find('pubDate').text
+        # Stream-parse the feed and stop after the top 5 items instead of building the whole DOM
+        with session.get(url, stream=True, timeout=10) as response:
+            response.raise_for_status()
+            response.raw.decode_content = True
             
-            news_items.append({
-                'title': title,
-                'link': link,
-                'pubDate': pub_date
-            })
+            for _, elem in ET.iterparse(response.raw, events=('end',)):
+                if elem.tag != 'item':
+                    continue
+                
+                # findtext tolerates missing sub-elements in malformed entries
+                item = {field: elem.findtext(field, '') for field in _NEWS_FIELDS}
+                item['published'] = _parse_pub_date(item['pubDate'])
+                news_items.append(item)
+                elem.clear()
+                
+                if len(news_items) == 5: # Top 5 news
+                    break
             
         return news_items
     except Exception as e:
         print(f"Error fetching news for {ticker}: {e}")
         return []
 
-import yfinance as yf
+def _av_str(val):
+    """Returns an Alpha Vantage text value, or None for missing data."""
+    if val is None or (isinstance(val, str) and val.strip() in _NULL_TOKENS):
+        return None
+    return val
+
+def _av_int(val):
+    """Converts an Alpha Vantage value to int, returning None for missing data."""
+    num = _av_float(val)
+    return int(num) if num is not None else None
+
+# Defaults returned by get_company_info when Alpha Vantage has no value
+_COMPANY_INFO_DEFAULTS = {
+    'summary': 'No summary available.',
+    'sector': 'Unknown',
+    'industry': 'Unknown',
+    'marketCap': None,
+    'forwardPE': None,
+    'targetMeanPrice': None,
+    'recommendationKey': 'Unknown',
+    'name': None,  # Set to the ticker by get_company_info
+    'exchange': 'Unknown',
+    'currency': 'USD',
+    'country': 'Unknown',
+    '52WeekHigh': None,
+    '52WeekLow': None,
+    # Valuation Metrics
+    'PERatio': None,
+    'PriceToBookRatio': None,
+    'DividendYield': None,
+    'ReturnOnEquityTTM': None,
+    'ProfitMargin': None,
+    'EVToEBITDA': None,
+    'PriceToSalesRatioTTM': None,
+    'Beta': None,
+    'PEGRatio': None
+}
+
+# (get_company_info key, Alpha Vantage OVERVIEW field, parser)
+_OVERVIEW_FIELDS = (
+    ('summary', 'Description', _av_str),
+    ('sector', 'Sector', _av_str),
+    ('industry', 'Industry', _av_str),
+    ('marketCap', 'MarketCapitalization', _av_int),
+    ('forwardPE', 'ForwardPE', _av_float),
+    ('targetMeanPrice', 'AnalystTargetPrice', _av_float),
+    ('name', 'Name', _av_str),
+    ('exchange', 'Exchange', _av_str),
+    ('currency', 'Currency', _av_str),
+    ('country', 'Country', _av_str),
+    ('52WeekHigh', '52WeekHigh', _av_float),
+    ('52WeekLow', '52WeekLow', _av_float),
+    ('PERatio', 'PERatio', _av_float),
+    ('PriceToBookRatio', 'PriceToBookRatio', _av_float),
+    ('DividendYield', 'DividendYield', _av_float),
+    ('ReturnOnEquityTTM', 'ReturnOnEquityTTM', _av_float),
+    ('ProfitMargin', 'ProfitMargin', _av_float),
+    ('EVToEBITDA', 'EVToEBITDA', _av_float),
+    ('PriceToSalesRatioTTM', 'PriceToSalesRatioTTM', _av_float),
+    ('Beta', 'Beta', _av_float),
+    ('PEGRatio', 'PEGRatio', _av_float)
+)
 
 def get_company_info(ticker):
     """
     Fetches company info using Alpha Vantage and Yahoo Finance.
     Merges data to get the most comprehensive metrics.
     """
-    info = {
-        'summary': 'No summary available.',
-        'sector': 'Unknown',
-        'industry': 'Unknown',
-        'marketCap': None,
-        'forwardPE': None,
-        'targetMeanPrice': None,
-        'recommendationKey': 'Unknown',
-        'name': ticker,
-        'exchange': 'Unknown',
-        'currency': 'USD',
-        'country': 'Unknown',
-        '52WeekHigh': None,
-        '52WeekLow': None,
-        # Valuation Metrics
-        'PERatio': None,
-        'PriceToBookRatio': None,
-        'DividendYield': None,
-        'ReturnOnEquityTTM': None,
-        'ProfitMargin': None,
-        'EVToEBITDA': None,
-        'PriceToSalesRatioTTM': None,
-        'Beta': None,
-        'PEGRatio': None
-    }
+    info = dict(_COMPANY_INFO_DEFAULTS, name=ticker)
 
     # 1. Try Alpha Vantage first (for consistency with existing flow)
     try:
-        # Rate limit: Wait if needed
-        alpha_vantage_limiter.wait_if_needed()
-        fd = FundamentalData(key=config.ALPHA_VANTAGE_API_KEY, output_format='json')
-        data, _ = fd.get_company_overview(ticker)
+        data = fetch_overview(ticker)
         
         if data:
-            info.update({
-                'summary': data.get('Description', info['summary']),
-                'sector': data.get('Sector', info['sector']),
-                'industry': data.get('Industry', info['industry']),
-                'marketCap': int(data.get('MarketCapitalization', 0)) if data.get('MarketCapitalization') and data.get('MarketCapitalization') != 'None' else None,
-                'forwardPE': safe_float(data.get('ForwardPE')),
-                'targetMeanPrice': safe_float(data.get('AnalystTargetPrice')),
-                'name': data.get('Name', ticker),
-                'exchange': data.get('Exchange', info['exchange']),
-                'currency': data.get('Currency', info['currency']),
-                'country': data.get('Country', info['country']),
-                '52WeekHigh': safe_float(data.get('52WeekHigh')),
-                '52WeekLow': safe_float(data.get('52WeekLow')),
-                'PERatio': safe_float(data.get('PERatio')),
-                'PriceToBookRatio': safe_float(data.get('PriceToBookRatio')),
-                'DividendYield': safe_float(data.get('DividendYield')),
-                'ReturnOnEquityTTM': safe_float(data.get('ReturnOnEquityTTM')),
-                'ProfitMargin': safe_float(data.get('ProfitMargin')),
-                'EVToEBITDA': safe_float(data.get('EVToEBITDA')),
-                'PriceToSalesRatioTTM': safe_float(data.get('PriceToSalesRatioTTM')),
-                'Beta': safe_float(data.get('Beta')),
-                'PEGRatio': safe_float(data.get('PEGRatio'))
-            })
+            for info_key, av_key, parse in _OVERVIEW_FIELDS:
+                value = parse(data.get(av_key))
+                if value is not None:
+                    info[info_key] = value
     except Exception as e:
         print(f"Alpha Vantage fetch failed for {ticker}: {e}")
 
@@ -128,39 +183,38 @@ def get_company_info(ticker):
         
     return info
 
+@cached(endpoint='balance_sheet', ttl=timedelta(days=90), memoize=True)
+def _fetch_balance_sheet(ticker):
+    """Fetches the raw Alpha Vantage annual balance sheet."""
+    # Rate limit: Wait if needed
+    alpha_vantage_limiter.wait_if_needed()
+    data = av_get('BALANCE_SHEET', ticker)
+    return data if 'annualReports' in data else {}
+
 def get_balance_sheet(ticker):
     """
     Fetches the latest annual balance sheet using Alpha Vantage.
     Returns a dictionary of key balance sheet items.
     """
     try:
-        # Rate limit: Wait if needed
-        alpha_vantage_limiter.wait_if_needed()
-        
-        fd = FundamentalData(key=config.ALPHA_VANTAGE_API_KEY, output_format='json')
-        bs, _ = fd.get_balance_sheet_annual(ticker)
+        bs = _fetch_balance_sheet(ticker)
         
-        latest = None
-        if isinstance(bs, dict) and 'annualReports' in bs and bs.get('annualReports'):
-            latest = bs['annualReports'][0]
-        elif hasattr(bs, 'iloc') and not bs.empty: # Handle DataFrame
-            latest = bs.iloc[0].to_dict()
+        reports = bs.get('annualReports')
+        latest = reports[0] if reports else None
         
         if not latest:
             return None
             
-        # Convert to dictionary with safe access and float conversion
-        def get_val(key):
-            val = latest.get(key)
-            return float(val) if val and val != 'None' else 0
+        # Convert to floats in one pass, treating missing values as 0
+        v = {key: _av_float(latest.get(key)) or 0 for key in _BALANCE_SHEET_FIELDS}
 
         return {
-            "Total Assets": get_val("totalAssets"),
-            "Total Liabilities": get_val("totalLiabilities"),
-            "Total Equity": get_val("totalShareholderEquity"),
-            "Cash And Cash Equivalents": get_val("cashAndCashEquivalentsAtCarryingValue"),
-            "Total Debt": get_val("shortTermDebt") + get_val("longTermDebt"), # Approximation
-            "Working Capital": get_val("totalCurrentAssets") - get_val("totalCurrentLiabilities"),
+            "Total Assets": v["totalAssets"],
+            "Total Liabilities": v["totalLiabilities"],
+            "Total Equity": v["totalShareholderEquity"],
+            "Cash And Cash Equivalents": v["cashAndCashEquivalentsAtCarryingValue"],
+            "Total Debt": v["shortTermDebt"] + v["longTermDebt"], # Approximation
+            "Working Capital": v["totalCurrentAssets"] - v["totalCurrentLiabilities"],
             "Date": latest.get("fiscalDateEnding", "N/A")
         }
         
@@ -174,32 +228,23 @@ def get_cash_flow(ticker):
     Returns a dictionary of key cash flow items.
     """
     try:
-        # Rate limit: Wait if needed
-        alpha_vantage_limiter.wait_if_needed()
+        cf = fetch_cash_flow(ticker)
         
-        fd = FundamentalData(key=config.ALPHA_VANTAGE_API_KEY, output_format='json')
-        cf, _ = fd.get_cash_flow_annual(ticker)
-        
-        latest = None
-        if isinstance(cf, dict) and 'annualReports' in cf and cf.get('annualReports'):
-            latest = cf['annualReports'][0]
-        elif hasattr(cf, 'iloc') and not cf.empty: # Handle DataFrame
-            latest = cf.iloc[0].to_dict()
+        reports = cf.get('annualReports')
+        latest = reports[0] if reports else None
             
         if not latest:
             return None
             
-        # Convert to dictionary with safe access and float conversion
-        def get_val(key):
-            val = latest.get(key)
-            return float(val) if val and val != 'None' else 0
+        # Convert to floats in one pass, treating missing values as 0
+        v = {key: _av_float(latest.get(key)) or 0 for key in _CASH_FLOW_FIELDS}
 
         return {
-            "Operating Cash Flow": get_val("operatingCashflow"),
-            "Investing Cash Flow": get_val("cashflowFromInvestment"),
-            "Financing Cash Flow": get_val("cashflowFromFinancing"),
-            "Capital Expenditure": get_val("capitalExpenditures"),
-            "Free Cash Flow": get_val("operatingCashflow") - abs(get_val("capitalExpenditures")),
+            "Operating Cash Flow": v["operatingCashflow"],
+            "Investing Cash Flow": v["cashflowFromInvestment"],
+            "Financing Cash Flow": v["cashflowFromFinancing"],
+            "Capital Expenditure": v["capitalExpenditures"],
+            "Free Cash Flow": v["operatingCashflow"] - abs(v["capitalExpenditures"]),
             "Date": latest.get("fiscalDateEnding", "N/A")
         }
         
@@ -207,80 +252,88 @@ def get_cash_flow(ticker):
         print(f"Error fetching cash flow for {ticker}: {e}")
         return None
 
+@cached(endpoint='income_statement', ttl=timedelta(days=90), memoize=True)
+def _fetch_income_statement(ticker):
+    """
+    Fetches the raw Alpha Vantage income statement (annual and quarterly reports).
+    Returns an empty dict if the response has no reports (e.g. API limit note).
+    """
+    # Rate limit: Wait if needed
+    alpha_vantage_limiter.wait_if_needed()
+    data = av_get('INCOME_STATEMENT', ticker)
+    return data if 'quarterlyReports' in data else {}
+
+# One reporting period returned by get_quarterly_financials / get_annual_financials
+FinancialPeriod = namedtuple('FinancialPeriod', ['fiscalDateEnding', 'totalRevenue', 'netIncome', 'reportedEPS'])
+
+def _parse_income_reports(reports):
+    """Extracts Revenue, Net Income and EPS from income statement reports."""
+    return [
+        FinancialPeriod(
+            fiscalDateEnding=report.get('fiscalDateEnding', 'N/A'),
+            totalRevenue=_av_float(report.get('totalRevenue')) or 0.0,
+            netIncome=_av_float(report.get('netIncome')) or 0.0,
+            # Use None for missing EPS instead of 0.0
+            reportedEPS=_av_float(report.get('reportedEPS'))
+        )
+        for report in reports
+    ]
+
 def get_quarterly_financials(ticker):
     """
     Fetches quarterly financial data (Revenue, Net Income, EPS) for the last 8 quarters.
     """
     try:
-        # Rate limit: Wait if needed
-        alpha_vantage_limiter.wait_if_needed()
-        
-        fd = FundamentalData(key=config.ALPHA_VANTAGE_API_KEY, output_format='json')
-        
-        # Get income statement
-        income_stmt, _ = fd.get_income_statement_annual(ticker) # Using annual method but it returns quarterly too usually? 
-        # Wait, get_income_statement_annual returns (data, meta_data). 
-        # Actually Alpha Vantage library has get_income_statement_quarterly?
-        # Let's check the library or use the generic get_income_statement which returns both.
-        
-        # The library method get_income_statement_annual actually calls the API with function=INCOME_STATEMENT
-        # and returns annual reports.
-        # There isn't a get_income_statement_quarterly in some versions, but let's try get_income_statement() if available
-        # or check what get_income_statement_annual returns.
-        # Usually the API returns both annual and quarterly in the JSON.
-        # The python library might parse it.
-        
-        # Let's use requests directly to be sure, or check if library supports it.
-        # Using requests is safer for specific structure.
-        
-        url = f"https://www.alphavantage.co/query?function=INCOME_STATEMENT&symbol={ticker}&apikey={config.ALPHA_VANTAGE_API_KEY}"
-        response = requests.get(url)
-        data = response.json()
-        
-        if 'quarterlyReports' not in data:
-            return []
-            
-        quarterly_data = []
-        for report in data['quarterlyReports'][:8]: # Last 8 quarters
-            # Safe EPS parsing - use None for missing data instead of 0.0
-            eps_raw = report.get('reportedEPS')
-            if eps_raw and eps_raw != 'None':
-                try:
-                    eps = float(eps_raw)
-                except (ValueError, TypeError):
-                    eps = None
-            else:
-                eps = None
-            
-            quarterly_data.append({
-                'fiscalDateEnding': report.get('fiscalDateEnding', 'N/A'),
-                'totalRevenue': float(report.get('totalRevenue', 0)),
-                'netIncome': float(report.get('netIncome', 0)),
-                'reportedEPS': eps
-            })
-            
-        return quarterly_data
+        # One INCOME_STATEMENT response carries both quarterly and annual reports
+        data = _fetch_income_statement(ticker)
+        return _parse_income_reports(data.get('quarterlyReports', [])[:8])
         
     except Exception as e:
         print(f"Error fetching quarterly financials for {ticker}: {e}")
         return []
 
-def get_earnings_history(ticker):
+def get_annual_financials(ticker):
     """
-    Fetches historical quarterly EPS data.
+    Fetches annual financial data (Revenue, Net Income, EPS) for the last 5 years.
+    Shares the cached INCOME_STATEMENT response with get_quarterly_financials.
     """
     try:
-        # Rate limit: Wait if needed
-        alpha_vantage_limiter.wait_if_needed()
+        data = _fetch_income_statement(ticker)
+        return _parse_income_reports(data.get('annualReports', [])[:5])
         
-        url = f"https://www.alphavantage.co/query?function=EARNINGS&symbol={ticker}&apikey={config.ALPHA_VANTAGE_API_KEY}"
-        response = requests.get(url)
-        data = response.json()
+    except Exception as e:
+        print(f"Error fetching annual financials for {ticker}: {e}")
+        return []
+
+@cached(endpoint='earnings', ttl=timedelta(days=90), memoize=True)
+def _fetch_earnings(ticker):
+    """
+    Fetches the raw Alpha Vantage earnings history.
+    Returns an empty dict if the response has no earnings (e.g. API limit note).
+    """
+    # Rate limit: Wait if needed
+    alpha_vantage_limiter.wait_if_needed()
+    data = av_get('EARNINGS', ticker)
+    return data if 'quarterlyEarnings' in data else {}
+
+# Quarterly earnings fields kept by get_earnings_history
+_EARNINGS_FIELDS = ('fiscalDateEnding', 'reportedDate', 'reportedEPS', 'estimatedEPS', 'surprisePercentage')
+
+def get_earnings_history(ticker, limit=8):
+    """
+    Fetches historical quarterly EPS data for the most recent `limit` quarters.
+    """
+    try:
+        data = _fetch_earnings(ticker)
         
         if 'quarterlyEarnings' not in data:
             return []
-            
-        return data['quarterlyEarnings']
+        
+        # Keep only the fields we use so the full raw records aren't carried around
+        return [
+            {key: quarter.get(key) for key in _EARNINGS_FIELDS}
+            for quarter in data['quarterlyEarnings'][:limit]
+        ]
         
     except Exception as e:
         print(f"Error fetching earnings history for {ticker}: {e}")
@@ -292,18 +345,78 @@ def get_context_for_ai(ticker):
     """
     info = get_company_info(ticker)
     news = get_news(ticker)
+    return _build_context(ticker, info, news)
+
+def get_contexts_for_ai(tickers):
+    """
+    Builds AI context strings for several tickers in parallel.
+    Calls are still gated by the shared Alpha Vantage rate limiter.
+    Returns a dictionary mapping ticker to context; tickers that fail are skipped.
+    """
+    contexts = {}
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        futures = {ticker: executor.submit(get_context_for_ai, ticker) for ticker in tickers}
     
-    context = f"Company: {ticker}\n"
-    context += f"Name: {info.get('name', ticker)}\n"
-    context += f"Sector: {info['sector']}\n"
-    context += f"Industry: {info['industry']}\n"
-    context += f"Summary: {info['summary']}\n\n"
+    for ticker, future in futures.items():
+        error = future.exception()
+        if error:
+            print(f"Error building AI context for {ticker}: {error}")
+            continue
+        contexts[ticker] = future.result()
     
-    context += "Recent News:\n"
-    for n in news:
-        context += f"- {n['title']} ({n['pubDate']})\n"
-        
-    return context
+    return contexts
+
+def _build_context(ticker, info, news):
+    """Formats company info and news items into the AI context string."""
+    parts = [
+        f"Company: {ticker}\n",
+        f"Name: {info.get('name', ticker)}\n",
+        f"Sector: {info['sector']}\n",
+        f"Industry: {info['industry']}\n",
+        f"Summary: {info['summary']}\n\n",
+        "Recent News:\n"
+    ]
+    parts.extend(f"- {n['title']} ({n['pubDate']})\n" for n in news)
+    
+    return "".join(parts)
+
+def clear_research_cache():
+    """
+    Drops memoized and on-disk Alpha Vantage responses so the next
+    lookup for any ticker is fetched fresh (e.g. on a forced refresh).
+    """
+    for fetch, endpoint in (
+        (fetch_overview, 'overview'),
+        (_fetch_balance_sheet, 'balance_sheet'),
+        (fetch_cash_flow, 'cash_flow'),
+        (_fetch_income_statement, 'income_statement'),
+        (_fetch_earnings, 'earnings')
+    ):
+        fetch.cache_clear()
+        file_cache.clear(endpoint)
+
+def get_research_bundle(ticker):
+    """
+    Fetches all research data for a ticker concurrently.
+    Each fetch is independent I/O, so wall-clock time is bounded by the slowest
+    request rather than the sum of all of them.
+    Returns a dictionary with info, news, quarterly_financials,
+    earnings_history and the AI context string.
+    """
+    fetchers = {
+        'info': get_company_info,
+        'news': get_news,
+        'quarterly_financials': get_quarterly_financials,
+        # 5-year P/E trend needs 20 quarters plus 3 more for the first TTM value
+        'earnings_history': partial(get_earnings_history, limit=24)
+    }
+    
+    with ThreadPoolExecutor(max_workers=len(fetchers)) as executor:
+        futures = {key: executor.submit(fetch, ticker) for key, fetch in fetchers.items()}
+        bundle = {key: future.result() for key, future in futures.items()}
+    
+    bundle['context'] = _build_context(ticker, bundle['info'], bundle['news'])
+    return bundle
 
 if __name__ == "__main__":
     print("Testing news fetch for AAPL...")